@@ -1,8 +1,10 @@
-from typing import List, Dict, Any
+import itertools
+from typing import Dict, Any, Iterable
 
 import requests
 
 from janelia_emrp.fibsem.volume_transfer_info import RenderConnect
+from janelia_emrp.render.web_service_request import submit_put, submit_put_spooled_json_object
 
 
 def get_response_json(url):
@@ -38,30 +40,30 @@ class RenderApi:
                             resolved_tiles: Dict[str, Any],
                             derive_data: bool = False):
         url = f"{self.get_stack_url(stack)}/resolvedTiles?deriveData={derive_data}"
-        print(f'submitting PUT {url} for {len(resolved_tiles["tileIdToSpecMap"])} tile specs')
-
-        response = requests.put(url, json=resolved_tiles)
-        response.raise_for_status()
+        submit_put(url=url,
+                   json=resolved_tiles,
+                   context=f'for {len(resolved_tiles["tileIdToSpecMap"])} tile specs')
 
     def save_tile_specs(self,
                         stack: str,
-                        tile_specs: List[Dict[str, Any]],
-                        derive_data: bool = False):
-        tile_id_to_spec_map = {}
-        for tile_spec in tile_specs:
-            tile_id_to_spec_map[tile_spec["tileId"]] = tile_spec
-
-        resolved_tiles = {"tileIdToSpecMap": tile_id_to_spec_map}
-
-        self.save_resolved_tiles(stack=stack,
-                                 resolved_tiles=resolved_tiles,
-                                 derive_data=derive_data)
+                        tile_specs: Iterable[Dict[str, Any]],
+                        derive_data: bool = False,
+                        max_tile_specs_per_request: int = 2048):
+        # large tile spec lists are saved in batches (render adds to or replaces existing specs)
+        # to limit the size of each request body, and each batch is spooled to disk as it is consumed
+        # so tile specs can be streamed from a generator without holding them all in memory
+        url = f"{self.get_stack_url(stack)}/resolvedTiles?deriveData={derive_data}"
+        tile_spec_iterator = iter(tile_specs)
+        for first_tile_spec in tile_spec_iterator:
+            batch = itertools.chain((first_tile_spec,),
+                                    itertools.islice(tile_spec_iterator, max_tile_specs_per_request - 1))
+            submit_put_spooled_json_object(url=url,
+                                           object_name="tileIdToSpecMap",
+                                           items=((tile_spec["tileId"], tile_spec) for tile_spec in batch))
 
     def save_mipmap_path_builder(self,
                                  stack: str,
                                  mipmap_path_builder: Dict[str, Any]):
         url = f"{self.get_stack_url(stack)}/mipmapPathBuilder"
-        print(f'submitting PUT {url}')
-
-        response = requests.put(url, json=mipmap_path_builder)
-        response.raise_for_status()
+        submit_put(url=url,
+                   json=mipmap_path_builder)
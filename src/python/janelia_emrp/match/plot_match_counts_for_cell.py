@@ -29,8 +29,7 @@ def main():
     max_count = 0
     bad_index = -1
 
-    for group_id in group_ids:
-        match_pairs = match_request.get_pairs_with_match_counts_for_group(group_id)
+    for match_pairs in match_request.get_pairs_with_match_counts_for_groups(group_ids):
         for pair in match_pairs:
             delta_z = int(float(pair["qGroupId"])) - int(float(pair["pGroupId"]))
             if delta_z == 1 and \
@@ -1,5 +1,7 @@
 from typing import List, Dict, Tuple
 
+import numpy as np
+
 # Column group ordering for standard 7 mFOV layout:
 #     03
 #   01  06
@@ -82,6 +84,16 @@ class FieldOfViewLayout:
                 row_offset = row_offset + 11
             column_group_index += 1
 
+        # row and col lookup tables indexed by [mfov_number, sfov_number] for bulk lookups
+        max_mfov_number = max(mfov_number for column_group in mfov_column_groups for mfov_number in column_group)
+        max_sfov_number = max(int(sfov_index_name) for sfov_index_name in sfov_index_name_to_row_col.keys())
+        self._row_table = np.full((max_mfov_number + 1, max_sfov_number + 1), -1, dtype=np.int32)
+        self._col_table = np.full_like(self._row_table, -1)
+        for mfov_name, (row_offset, col_offset) in self.mfov_name_to_offsets.items():
+            for sfov_index_name, (sfov_row, sfov_col) in sfov_index_name_to_row_col.items():
+                self._row_table[int(mfov_name), int(sfov_index_name)] = sfov_row + row_offset
+                self._col_table[int(mfov_name), int(sfov_index_name)] = sfov_col + col_offset
+
     def row_and_col(self,
                     mfov_name: str,
                     sfov_index_name: str) -> (int, int):
@@ -89,6 +101,28 @@ class FieldOfViewLayout:
         sfov_row, sfov_col = self.sfov_index_name_to_row_col[sfov_index_name]
         return sfov_row + row_offset, sfov_col + col_offset
 
+    def row_and_col_bulk(self,
+                         mfov_numbers: np.ndarray,
+                         sfov_numbers: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Vectorized version of row_and_col that takes integer mfov and sfov numbers
+        (e.g. 3 and 42 for mfov_name "000003" and sfov_index_name "042").
+        """
+        mfov_numbers = np.asarray(mfov_numbers)
+        sfov_numbers = np.asarray(sfov_numbers)
+        # check bounds explicitly since out of range numbers would raise IndexError and negative numbers would wrap
+        max_mfov_number, max_sfov_number = (size - 1 for size in self._row_table.shape)
+        if mfov_numbers.size > 0 and \
+                (mfov_numbers.min() < 0 or mfov_numbers.max() > max_mfov_number or
+                 sfov_numbers.min() < 0 or sfov_numbers.max() > max_sfov_number):
+            raise KeyError("layout does not contain all of the specified mfov and sfov numbers")
+
+        rows = self._row_table[mfov_numbers, sfov_numbers]
+        cols = self._col_table[mfov_numbers, sfov_numbers]
+        if np.any(rows < 0):
+            raise KeyError("layout does not contain all of the specified mfov and sfov numbers")
+        return rows, cols
+
     def build_sfov_index_name_matrix(self) -> List[List[str]]:
         max_row_offset = 0
         max_col_offset = 0
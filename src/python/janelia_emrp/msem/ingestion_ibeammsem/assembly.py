@@ -2,7 +2,6 @@
 
 from __future__ import annotations
 
-import itertools
 from functools import partial
 from typing import TYPE_CHECKING
 
@@ -18,7 +17,7 @@ from skimage.transform import EuclideanTransform
 from constant import FACTOR_THUMBNAIL, N_BEAMS
 from path import get_image_paths, get_slab_path
 from roi import get_mfovs
-from xdim import XDim
+from xdim import XDIM_MFOV
 from xvar import XVar
 
 matplotlib.use("tkagg")
@@ -66,7 +65,7 @@ def get_xy_slab(
     return (
         xlog[[XVar.X, XVar.Y]]
         .sel(scan=scan, slab=slab, mfov=mfovs if mfovs is not None else slice(0, None))
-        .dropna(XDim.MFOV, how="all")
+        .dropna(XDIM_MFOV, how="all")
         .to_dataarray()
         .values
     )
@@ -159,9 +158,12 @@ def plot_aligned_slab(
     paths = get_image_paths(slab_path=slab_path, mfovs=mfovs, thumbnail=thumbnail)
     with Client(processes=True) as client:
         images = open_sfovs(paths=paths, client=client)
-    for (mfov, sfov), image in zip(
-        itertools.product(mfovs, np.arange(N_BEAMS)), images
-    ):
+    # flat per-image (mfov, sfov) indices in the same order as the image paths,
+    # used to gather all SFOV centers at once as an (n_images, 2) array
+    mfov_ids = np.repeat(np.asarray(mfovs, dtype=np.int32), N_BEAMS)
+    sfov_ids = np.tile(np.arange(N_BEAMS, dtype=np.int32), len(mfovs))
+    xy_images = xy[:, mfov_ids, sfov_ids].T
+    for i, image in enumerate(images):
         sfov_patch = ax.imshow(
             image,
             extent=(0, image.shape[1], 0, image.shape[0]),
@@ -174,7 +176,7 @@ def plot_aligned_slab(
             Affine2D()
             .translate(-image.shape[1] / 2, -image.shape[0] / 2)
             .rotate_deg(rotation)
-            .translate(*xy[:, mfov, sfov])
+            .translate(*xy_images[i])
         )
         sfov_patch.set_transform(transform + ax.transData)
     fig.suptitle("Slab assembled in local space. Recommended for ingestion.")
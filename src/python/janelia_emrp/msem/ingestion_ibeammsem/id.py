@@ -7,7 +7,7 @@ from typing import TYPE_CHECKING
 import numpy as np
 
 from roi import get_n_slabs
-from xdim import XDim
+from xdim import XDIM_SLAB
 from xvar import XVar
 
 if TYPE_CHECKING:
@@ -16,7 +16,7 @@ if TYPE_CHECKING:
 
 def get_all_magc_ids(xlog: xr.Dataset) -> np.ndarray:
     """Gets all MagC IDs of the wafer."""
-    return xlog[XDim.SLAB].values
+    return xlog[XDIM_SLAB].values
 
 
 def get_serial_ids(
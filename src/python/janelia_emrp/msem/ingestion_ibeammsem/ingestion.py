@@ -45,7 +45,11 @@ matplotlib.use("tkagg")
 
 def main(arguments) -> None:
     """See parse_arguments for the arguments."""
-    xlog = xr.open_zarr(arguments.path_xlog)
+    # chunks=None opens the xlog lazily indexed without building dask chunk graphs.
+    #   Selections of small blocks only read those blocks, while helpers that reduce over
+    #   a whole scan or wafer (e.g. get_slabs, get_n_slabs, get_n_mfovs, get_percentage_tissue)
+    #   load the selected variable into memory with NumPy instead of computing chunk by chunk.
+    xlog = xr.open_zarr(arguments.path_xlog, chunks=None)
 
     # id
     println(f"{get_all_magc_ids(xlog=xlog) = }")
@@ -9,8 +9,12 @@ from constant import N_BEAMS
 from xvar import XVar
 
 if TYPE_CHECKING:
+    import numpy as np
     import xarray as xr
 
+_SFOV_NAMES = tuple(f"sfov_{sfov+1:03}.png" for sfov in range(N_BEAMS))
+_THUMBNAIL_NAMES = tuple(f"thumbnail_{sfov+1:03}.png" for sfov in range(N_BEAMS))
+
 
 def get_slab_path(xlog: xr.Dataset, scan: int, slab: int) -> Path:
     """Gets the slab path.
@@ -49,12 +53,17 @@ def get_thumbnail_path(slab_path: Path, mfov: int, sfov: int) -> Path:
 
 
 def get_image_paths(
-    slab_path: Path, mfovs: list[int], *, thumbnail: bool = True
-) -> list[int]:
-    """Returns SFOV or thumbnail paths of MFOVs in a slab."""
-    get_path = get_thumbnail_path if thumbnail else get_sfov_path
+    slab_path: Path, mfovs: list[int] | np.ndarray, *, thumbnail: bool = True
+) -> list[Path]:
+    """Returns SFOV or thumbnail paths of MFOVs in a slab.
+
+    The paths are ordered by MFOV, then by SFOV,
+        i.e., they match the (n_mfovs, N_BEAMS) layout of get_xy_slab.
+    Each MFOV path is built once and joined with the N_BEAMS image names.
+    """
+    image_names = _THUMBNAIL_NAMES if thumbnail else _SFOV_NAMES
     return [
-        get_path(slab_path=slab_path, mfov=mfov, sfov=sfov)
-        for mfov in mfovs
-        for sfov in range(N_BEAMS)
+        mfov_path / image_name
+        for mfov_path in (get_mfov_path(slab_path=slab_path, mfov=mfov) for mfov in mfovs)
+        for image_name in image_names
     ]
@@ -8,7 +8,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 
 from constant import N_BEAMS
-from xdim import XDim
+from xdim import XDIM_MFOV, XDIM_SFOV, XDIM_SLAB
 from xvar import XVar
 
 if TYPE_CHECKING:
@@ -42,7 +42,7 @@ def get_roi_sfovs(
     The boundary grows inwards  with a negative dilation.
     """
     mask = xlog[XVar.DISTANCE_ROI].sel(slab=slab, mfov=mfov) < dilation
-    return mask.where(mask).dropna(XDim.SFOV)[XDim.SFOV].astype(int).values
+    return mask.where(mask).dropna(XDIM_SFOV)[XDIM_SFOV].astype(int).values
 
 
 def plot_tissue_sfovs(
@@ -77,8 +77,8 @@ def get_slabs(xlog: xr.Dataset, scan: int) -> np.ndarray:
     return (
         xlog[XVar.ACQUISITION]
         .sel(scan=scan, mfov=slice(0, None))
-        .sum(XDim.MFOV, min_count=1)
-        .dropna(XDim.SLAB)[XDim.SLAB]
+        .sum(XDIM_MFOV, min_count=1)
+        .dropna(XDIM_SLAB)[XDIM_SLAB]
         .values.astype(int)
     )
 
@@ -88,8 +88,8 @@ def get_n_slabs(xlog: xr.Dataset, scan: int) -> np.ndarray:
     return (
         xlog[XVar.ACQUISITION]
         .sel(scan=scan, mfov=slice(0, None))
-        .sum(XDim.MFOV, min_count=1)
-        .dropna(XDim.SLAB)[XDim.SLAB]
+        .sum(XDIM_MFOV, min_count=1)
+        .dropna(XDIM_SLAB)[XDIM_SLAB]
         .size
     )
 
@@ -124,7 +124,7 @@ def get_mfovs(xlog: xr.Dataset, slab: int) -> np.ndarray:
     return (
         xlog[XVar.ACQUISITION]
         .sel(scan=0, slab=slab, mfov=slice(0, None))
-        .dropna(XDim.MFOV)[XDim.MFOV]
+        .dropna(XDIM_MFOV)[XDIM_MFOV]
         .values
     )
 
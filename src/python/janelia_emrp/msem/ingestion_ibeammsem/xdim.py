@@ -1,6 +1,7 @@
 """XDim."""
 
 from enum import StrEnum, auto
+from typing import Final
 
 
 class XDim(StrEnum):
@@ -12,3 +13,12 @@ class XDim(StrEnum):
     SFOV = auto()
     BIN = auto()
     """histogram bins. [0, ..., 255], inclusive."""
+
+
+# Plain string dimension names used by all xarray selections and reductions.
+# They skip the enum machinery; XDim only remains as the single source of these names.
+XDIM_SCAN: Final = XDim.SCAN.value
+XDIM_SLAB: Final = XDim.SLAB.value
+XDIM_MFOV: Final = XDim.MFOV.value
+XDIM_SFOV: Final = XDim.SFOV.value
+XDIM_BIN: Final = XDim.BIN.value
@@ -1,13 +1,17 @@
 import argparse
 import csv
 import logging
+import os
 import re
 import sys
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Any, Optional
+from typing import List, Any, Optional, Iterator
 
+import numpy as np
 import renderapi
 from PIL import Image
 from renderapi import Render
@@ -17,7 +21,8 @@ from janelia_emrp.fibsem.render_api import RenderApi
 from janelia_emrp.fibsem.volume_transfer_info import params_to_render_connect
 from janelia_emrp.msem.field_of_view_layout \
     import NINETY_ONE_SFOV_NAME_TO_ROW_COL, FieldOfViewLayout, NINETEEN_MFOV_COLUMN_GROUPS
-from janelia_emrp.msem.scan_fit_parameters import load_scan_fit_parameters, ScanFitParameters
+from janelia_emrp.msem.scan_fit_parameters import load_scan_fit_parameters, ScanFitParameters, \
+    load_scan_fit_parameters_for_scan
 from janelia_emrp.msem.wafer_info import load_wafer_info, WaferInfo, build_wafer_info_parent_parser
 from janelia_emrp.root_logger import init_logger
 
@@ -27,47 +32,54 @@ logger = logging.getLogger(__name__)
 
 WAFER_53_LAYOUT = FieldOfViewLayout(NINETEEN_MFOV_COLUMN_GROUPS, NINETY_ONE_SFOV_NAME_TO_ROW_COL)
 
+AFFINE_MODEL_CLASS_NAME = sys.intern("mpicbg.trakem2.transform.AffineModel2D")
+
+
+def build_tile_spec_template(stage_z: int,
+                             tile_width: int,
+                             tile_height: int) -> dict[str, Any]:
+    return {
+        "z": stage_z, "width": tile_width, "height": tile_height, "minIntensity": 0, "maxIntensity": 255
+    }
+
 
 def build_tile_spec(image_path: Path,
                     stage_x: int,
                     stage_y: int,
-                    stage_z: int,
+                    section_id: str,
                     tile_id: str,
-                    tile_width: int,
-                    tile_height: int,
-                    mfov_name: str,
-                    sfov_index_name: str,
-                    min_x: int,
-                    min_y: int,
-                    scan_fit_parameters: ScanFitParameters,
-                    margin: int) -> dict[str, Any]:
+                    tile_spec_template: dict[str, Any],
+                    image_row: int,
+                    image_col: int,
+                    translate_x: int,
+                    translate_y: int,
+                    scan_correction_transform_spec: dict[str, str]) -> dict[str, Any]:
 
     # TODO: need to get and save working distance
 
-    section_id = f'{stage_z}.0'
-    image_row, image_col = WAFER_53_LAYOUT.row_and_col(mfov_name, sfov_index_name)
-
     mipmap_level_zero = {"imageUrl": f'file:{image_path}'}
 
-    transform_data_string = f'1 0 0 1 {stage_x - min_x + margin} {stage_y - min_y + margin}'
+    transform_data_string = f'1 0 0 1 {translate_x} {translate_y}'
 
+    # values shared by all tiles in the scan (z, width, height, intensity range) come from the template
     tile_spec = {
-        "tileId": tile_id, "z": stage_z,
+        "tileId": tile_id,
+        **tile_spec_template,
         "layout": {
             "sectionId": section_id,
             "imageRow": image_row, "imageCol": image_col,
             "stageX": stage_x, "stageY": stage_y
         },
-        "width": tile_width, "height": tile_height, "minIntensity": 0, "maxIntensity": 255,
         "mipmapLevels": {
             "0": mipmap_level_zero
         },
         "transforms": {
             "type": "list",
-            "specList": [
-                scan_fit_parameters.to_transform_spec(),
-                {"className": "mpicbg.trakem2.transform.AffineModel2D", "dataString": transform_data_string}
-            ]
+            # tuple (serialized as a JSON list) with the scan correction spec shared by all tiles in the scan
+            "specList": (
+                scan_correction_transform_spec,
+                {"className": AFFINE_MODEL_CLASS_NAME, "dataString": transform_data_string}
+            )
         }
     }
 
@@ -75,81 +87,129 @@ def build_tile_spec(image_path: Path,
 
 
 # unix_relative_image_path: 000003/002_000003_001_2022-04-01T1723012239596.png
-unix_relative_image_path_pattern = re.compile(r"(^\d+)/(\d{3}_\d{6}_(\d{3})_\d{4}-\d{2}-\d{2}T\d{13}).png$")
+#   groups: mfov_name, sfov base name, sfov_index_name, year, month, day, hhmmss (microseconds are dropped)
+unix_relative_image_path_pattern = re.compile(r"(^\d+)/(\d{3}_\d{6}_(\d{3}))_(\d{4})-(\d{2})-(\d{2})T(\d{6})\d{7}.png$")
 
 
-def build_tile_specs_for_slab_scan(slab_scan_path: Path,
-                                   stage_z: int) -> list[dict[str, Any]]:
+@dataclass
+class SlabScanTileData:
+    slab_scan_path: Path
+    scan_fit_parameters: ScanFitParameters
+    tile_width: Optional[int]
+    tile_height: Optional[int]
+    # (short_sfov_name, mfov_name, sfov_index_name, image_path, stage_x, stage_y) sorted by short_sfov_name
+    tile_data: list[tuple[str, str, str, Path, int, int]]
 
-    scan_fit_parameters = load_scan_fit_parameters(slab_scan_path)
+
+def load_slab_scan_tile_data(slab_scan_path: Path,
+                             scan_fit_parameters: Optional[ScanFitParameters] = None) -> SlabScanTileData:
+
+    if scan_fit_parameters is None:
+        scan_fit_parameters = load_scan_fit_parameters(slab_scan_path)
 
     tile_data = []
     tile_width = None
     tile_height = None
-    min_x = None
-    min_y = None
     full_image_coordinates_path = Path(slab_scan_path, "full_image_coordinates.txt")
 
-    if full_image_coordinates_path.exists():
+    # Open the coordinates file directly instead of stat-ing it first
+    # (import_slab_stacks_for_wafer has already listed the scan directory to find the slab directory).
+    # A missing coordinates file is logged and results in no tile data, as before.
+    try:
         with open(full_image_coordinates_path, 'r') as data_file:
-            # 000007\020_000007_082_2022-04-03T0154134018404.png	2014641.659	915550.903	0
-            for row in csv.reader(data_file, delimiter="\t"):
-                unix_relative_image_path = row[0].replace('\\', '/')
-                stage_x = int(float(row[1]))
-                stage_y = int(float(row[2]))
-                image_path = Path(slab_scan_path, unix_relative_image_path)
-
-                unix_relative_image_path_match = unix_relative_image_path_pattern.match(unix_relative_image_path)
-                if not unix_relative_image_path_match:
-                    raise RuntimeError(f"failed to parse unix_relative_image_path {unix_relative_image_path} "
-                                       f"in {full_image_coordinates_path}")
-
-                mfov_name = unix_relative_image_path_match.group(1)
-
-                # Slightly shorten/simplify tile id so that it works better with web UIs.
-                # Technically, scan timestamp could be completely removed because stage_z gets appended to tile_id.
-                # Decided to keep scan time with truncated microseconds in the id because it is nice context to have.
-                # Example shortening: 020_000007_082_2022-04-03T0154134018404 => 020_000007_082_20220403_015413
-                short_sfov_name = unix_relative_image_path_match.group(2).replace("-", "").replace("T", "_")[:-7]
-                tile_id = f"{short_sfov_name}.{stage_z}.0"
-
-                sfov_index_name = unix_relative_image_path_match.group(3)
-
-                if not tile_width:
-                    image = Image.open(image_path)
-                    tile_width = image.width
-                    tile_height = image.height
-                    min_x = stage_x
-                    min_y = stage_y
-                else:
-                    min_x = min(min_x, stage_x)
-                    min_y = min(min_y, stage_y)
-
-                tile_data.append(
-                    (tile_id, mfov_name, sfov_index_name, image_path, stage_x, stage_y))
-    else:
+            rows = list(csv.reader(data_file, delimiter="\t"))
+    except FileNotFoundError:
         logger.warning(f'{full_image_coordinates_path} not found')
+        rows = []
+
+    # 000007\020_000007_082_2022-04-03T0154134018404.png	2014641.659	915550.903	0
+    for row in rows:
+        unix_relative_image_path = row[0].replace('\\', '/')
+        stage_x = int(float(row[1]))
+        stage_y = int(float(row[2]))
+        image_path = Path(slab_scan_path, unix_relative_image_path)
+
+        unix_relative_image_path_match = unix_relative_image_path_pattern.match(unix_relative_image_path)
+        if not unix_relative_image_path_match:
+            raise RuntimeError(f"failed to parse unix_relative_image_path {unix_relative_image_path} "
+                               f"in {full_image_coordinates_path}")
+
+        mfov_name = unix_relative_image_path_match.group(1)
+
+        # Slightly shorten/simplify tile id so that it works better with web UIs.
+        # Technically, scan timestamp could be completely removed because stage_z gets appended to tile_id.
+        # Decided to keep scan time with truncated microseconds in the id because it is nice context to have.
+        # Example shortening: 020_000007_082_2022-04-03T0154134018404 => 020_000007_082_20220403_015413
+        sfov_base_name, year, month, day, hhmmss = unix_relative_image_path_match.group(2, 4, 5, 6, 7)
+        short_sfov_name = f"{sfov_base_name}_{year}{month}{day}_{hhmmss}"
+
+        sfov_index_name = unix_relative_image_path_match.group(3)
+
+        if not tile_width:
+            image = Image.open(image_path)
+            tile_width = image.width
+            tile_height = image.height
+
+        tile_data.append(
+            (short_sfov_name, mfov_name, sfov_index_name, image_path, stage_x, stage_y))
+
+    return SlabScanTileData(slab_scan_path=slab_scan_path,
+                            scan_fit_parameters=scan_fit_parameters,
+                            tile_width=tile_width,
+                            tile_height=tile_height,
+                            tile_data=sorted(tile_data))
+
+
+def iterate_tile_specs_for_slab_scan_tile_data(slab_scan_tile_data: SlabScanTileData,
+                                               stage_z: int,
+                                               margin: int = 400) -> Iterator[dict[str, Any]]:
+    tile_data = slab_scan_tile_data.tile_data
+    section_id = f'{stage_z}.0'
+    tile_id_suffix = f'.{section_id}'
+    tile_spec_template = build_tile_spec_template(stage_z=stage_z,
+                                                  tile_width=slab_scan_tile_data.tile_width,
+                                                  tile_height=slab_scan_tile_data.tile_height)
+
+    # scan correction is the same for every tile in the scan, so build its spec once and share it
+    scan_correction_transform_spec = slab_scan_tile_data.scan_fit_parameters.to_transform_spec()
+
+    if len(tile_data) > 0:
+        # one contiguous int32 array with columns stage_x, stage_y, mfov_number, sfov_number
+        # (stage coordinates are well within int32 range)
+        tile_values = np.array([(stage_x, stage_y, int(mfov_name), int(sfov_index_name))
+                                for (_, mfov_name, sfov_index_name, _, stage_x, stage_y) in tile_data],
+                               dtype=np.int32)
+
+        # translate all stage coordinates at once so that the scan's top left tile lands at (margin, margin)
+        stage_xy = tile_values[:, 0:2]
+        translate_xy_list = (stage_xy - stage_xy.min(axis=0) + margin).tolist()
+
+        image_rows, image_cols = WAFER_53_LAYOUT.row_and_col_bulk(tile_values[:, 2], tile_values[:, 3])
+        image_row_col_list = list(zip(image_rows.tolist(), image_cols.tolist()))
+    else:
+        translate_xy_list = []
+        image_row_col_list = []
+
+    # specs are yielded one at a time so that callers can stream them to render without holding the full list
+    for (short_sfov_name, _, _, image_path, stage_x, stage_y), (translate_x, translate_y), (image_row, image_col) \
+            in zip(tile_data, translate_xy_list, image_row_col_list):
+        yield build_tile_spec(image_path=image_path,
+                              stage_x=stage_x,
+                              stage_y=stage_y,
+                              section_id=section_id,
+                              tile_id=short_sfov_name + tile_id_suffix,
+                              tile_spec_template=tile_spec_template,
+                              image_row=image_row,
+                              image_col=image_col,
+                              translate_x=translate_x,
+                              translate_y=translate_y,
+                              scan_correction_transform_spec=scan_correction_transform_spec)
 
-    tile_specs = [
-        build_tile_spec(image_path=image_path,
-                        stage_x=stage_x,
-                        stage_y=stage_y,
-                        stage_z=stage_z,
-                        tile_id=tile_id,
-                        tile_width=tile_width,
-                        tile_height=tile_height,
-                        mfov_name=mfov_name,
-                        sfov_index_name=sfov_index_name,
-                        min_x=min_x,
-                        min_y=min_y,
-                        scan_fit_parameters=scan_fit_parameters,
-                        margin=400)
-        for (tile_id, mfov_name, sfov_index_name, image_path, stage_x, stage_y) in sorted(tile_data)
-    ]
-
-    logger.info(f'build_tile_specs_for_slab_scan: loaded {len(tile_specs)} tile specs from {slab_scan_path}')
 
-    return tile_specs
+def build_tile_specs_for_slab_scan(slab_scan_path: Path,
+                                   stage_z: int) -> list[dict[str, Any]]:
+    return list(iterate_tile_specs_for_slab_scan_tile_data(slab_scan_tile_data=load_slab_scan_tile_data(slab_scan_path),
+                                                           stage_z=stage_z))
 
 
 def get_stack_metadata_or_none(render: Render,
@@ -162,18 +222,45 @@ def get_stack_metadata_or_none(render: Render,
     return stack_metadata
 
 
+def list_directory_names(path: Path) -> frozenset[str]:
+    try:
+        with os.scandir(path) as entries:
+            return frozenset(entry.name for entry in entries)
+    except OSError as e:
+        logger.warning(f'failed to list {path}: {e}')
+        return frozenset()
+
+
 def import_slab_stacks_for_wafer(render_ws_host: str,
                                  render_owner: str,
                                  wafer_info: WaferInfo,
                                  import_scan_name_list: list[str],
-                                 import_project_name_list: list[str]):
+                                 import_project_name_list: list[str],
+                                 max_load_workers: int = 8):
 
     func_name = "import_slab_stacks_for_wafer"
 
+    import_scan_names = frozenset(import_scan_name_list)
+    import_project_names = frozenset(import_project_name_list)
+
+    import_scan_paths = []
+    for scan_path in wafer_info.scan_paths:
+        # scan_path: /nrs/hess/render/raw/wafer_53/imaging/msem/scan_003/wafer_53_scan_003_20220501_08-46-34
+        if len(import_scan_names) == 0 or scan_path.parent.name in import_scan_names:
+            import_scan_paths.append(scan_path)
+        else:
+            logger.debug(f'{func_name}: ignoring {scan_path.name}')
+
+    # derive scan level data once instead of once for every slab in the scan:
+    # one directory listing per scan replaces a file system check for every slab in the scan
+    scan_path_to_dir_names = {scan_path: list_directory_names(scan_path) for scan_path in import_scan_paths}
+    scan_path_to_fit_parameters = {scan_path: load_scan_fit_parameters_for_scan(scan_path)
+                                   for scan_path in import_scan_paths}
+
     for slab_group in wafer_info.slab_group_list:
         project_name = slab_group.to_render_project_name()
 
-        if len(import_project_name_list) > 0 and project_name not in import_project_name_list:
+        if len(import_project_names) > 0 and project_name not in import_project_names:
             logger.debug(f'{func_name}: ignoring slabs for project {project_name}')
             continue
 
@@ -199,13 +286,26 @@ def import_slab_stacks_for_wafer(render_ws_host: str,
             stack_is_in_loading_state = False
             z = 1
 
-            for scan_path in wafer_info.scan_paths:
-                # scan_path: /nrs/hess/render/raw/wafer_53/imaging/msem/scan_003/wafer_53_scan_003_20220501_08-46-34
-                if len(import_scan_name_list) == 0 or scan_path.parent.name in import_scan_name_list:
-                    slab_scan_path = Path(scan_path, slab_info.dir_name)
-                    tile_specs = build_tile_specs_for_slab_scan(slab_scan_path, z)
+            slab_scan_paths = []
+            slab_scan_fit_parameters = []
+            for scan_path in import_scan_paths:
+                slab_scan_path = Path(scan_path, slab_info.dir_name)
+                if slab_info.dir_name in scan_path_to_dir_names[scan_path]:
+                    slab_scan_paths.append(slab_scan_path)
+                    slab_scan_fit_parameters.append(scan_path_to_fit_parameters[scan_path])
+                else:
+                    logger.warning(f'{func_name}: {slab_scan_path} not found')
+
+            # Tile data for each scan is loaded in parallel (mostly file I/O) while specs are saved in scan order,
+            # so z values are assigned deterministically and saving overlaps with loading of subsequent scans.
+            with ThreadPoolExecutor(max_workers=max_load_workers) as executor:
+                for slab_scan_tile_data in executor.map(load_slab_scan_tile_data,
+                                                        slab_scan_paths,
+                                                        slab_scan_fit_parameters):
+                    tile_data = slab_scan_tile_data.tile_data
+                    scan_name = slab_scan_tile_data.slab_scan_path.parent.name
 
-                    if len(tile_specs) > 0:
+                    if len(tile_data) > 0:
 
                         if not stack_is_in_loading_state:
                             ensure_stack_is_in_loading_state(render=render,
@@ -213,17 +313,17 @@ def import_slab_stacks_for_wafer(render_ws_host: str,
                                                              wafer_info=wafer_info)
                             stack_is_in_loading_state = True
 
-                        tile_id_range = f'{tile_specs[0]["tileId"]} to {tile_specs[-1]["tileId"]}'
-                        logger.info(f"{func_name}: saving tiles {tile_id_range} in stack {stack}")
+                        tile_id_range = f'{tile_data[0][0]}.{z}.0 to {tile_data[-1][0]}.{z}.0'
+                        logger.info(f"{func_name}: saving {len(tile_data)} tiles {tile_id_range} in stack {stack}")
+
+                        # stream specs to render as they are built instead of materializing the full list
+                        tile_specs = iterate_tile_specs_for_slab_scan_tile_data(slab_scan_tile_data, z)
                         render_api.save_tile_specs(stack=stack,
                                                    tile_specs=tile_specs,
                                                    derive_data=True)
                         z += 1
                     else:
-                        logger.debug(f'{func_name}: no tile specs in {scan_path.name} for stack {stack}')
-
-                else:
-                    logger.debug(f'{func_name}: ignoring {scan_path.name} for stack {stack}')
+                        logger.debug(f'{func_name}: no tile specs in {scan_name} for stack {stack}')
 
             if stack_is_in_loading_state:
                 renderapi.stack.set_stack_state(stack, 'COMPLETE', render=render)
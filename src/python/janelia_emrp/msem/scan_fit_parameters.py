@@ -1,3 +1,4 @@
+import functools
 import re
 import sys
 from dataclasses import dataclass, field
@@ -21,21 +22,16 @@ class ScanFitParameters:
         }
 
 
+# scan_path: /nrs/hess/render/raw/wafer_53/imaging/msem/scan_001/wafer_53_scan_001_20220427_23-16-30
+scan_path_pattern = re.compile(r"^(.*)/imaging/msem/scan.*/wafer_\d+_scan_(\d+)_\d{8}_\d{2}-\d{2}-\d{2}$")
+
 # slab_scan_path: /nrs/hess/render/raw/wafer_53/imaging/msem/scan_001/wafer_53_scan_001_20220427_23-16-30/002_
 slab_scan_path_pattern = re.compile(r"^(.*)/imaging/msem/scan.*/wafer_\d+_scan_(\d+)_\d{8}_\d{2}-\d{2}-\d{2}/\d+_$")
 
 
-def load_scan_fit_parameters(slab_scan_path: Path) -> ScanFitParameters:
-
-    slab_scan_path_match = slab_scan_path_pattern.match(str(slab_scan_path))
-    if not slab_scan_path_match:
-        raise RuntimeError(f"failed to parse slab_scan_path {slab_scan_path}")
-
-    wafer_base_path = Path(slab_scan_path_match.group(1))
-    scan_name = slab_scan_path_match.group(2)
-    scan_index = int(scan_name)
-
-    fit_parameters_path = Path(wafer_base_path, f"sfov_correction/average_fit_parameters_for_all_scans.txt")
+# The same wafer level file is used for every slab scan, so only read it once.
+@functools.lru_cache(maxsize=None)
+def load_fit_parameter_values(fit_parameters_path: Path) -> tuple[float, ...]:
 
     if not fit_parameters_path.exists():
         raise RuntimeError(f"{fit_parameters_path} not found")
@@ -48,6 +44,22 @@ def load_scan_fit_parameters(slab_scan_path: Path) -> ScanFitParameters:
     if len(values) < 3:
         raise RuntimeError(f"expected at least 3 lines but found {len(values)} lines in {fit_parameters_path}")
 
+    return tuple(values)
+
+
+def load_scan_fit_parameters_for_scan(scan_path: Path) -> ScanFitParameters:
+
+    scan_path_match = scan_path_pattern.match(str(scan_path))
+    if not scan_path_match:
+        raise RuntimeError(f"failed to parse scan_path {scan_path}")
+
+    wafer_base_path = Path(scan_path_match.group(1))
+    scan_name = scan_path_match.group(2)
+    scan_index = int(scan_name)
+
+    fit_parameters_path = Path(wafer_base_path, f"sfov_correction/average_fit_parameters_for_all_scans.txt")
+    values = load_fit_parameter_values(fit_parameters_path)
+
     return ScanFitParameters(path=fit_parameters_path,
                              scan_name=scan_name,
                              scan_index=scan_index,
@@ -56,6 +68,16 @@ def load_scan_fit_parameters(slab_scan_path: Path) -> ScanFitParameters:
                              c=values[2])
 
 
+def load_scan_fit_parameters(slab_scan_path: Path) -> ScanFitParameters:
+
+    slab_scan_path_match = slab_scan_path_pattern.match(str(slab_scan_path))
+    if not slab_scan_path_match:
+        raise RuntimeError(f"failed to parse slab_scan_path {slab_scan_path}")
+
+    # fit parameters are the same for all slabs in a scan
+    return load_scan_fit_parameters_for_scan(slab_scan_path.parent)
+
+
 def main(argv: List[str]):
     fit_parameters = load_scan_fit_parameters(slab_scan_path=Path(argv[1]))
     print(fit_parameters)
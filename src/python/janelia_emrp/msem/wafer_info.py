@@ -40,12 +40,13 @@ def load_wafer_info(wafer_base_path: Path,
     # /nrs/hess/render/raw/wafer_53/imaging/msem/scan_003/wafer_53_scan_003_20220501_08-46-34
     #   /012_/000003/012_000003_042_2022-05-01T0618013636729.png
 
+    exclude_scan_names = frozenset(exclude_scan_name_list)
     scan_paths = []
     for relative_scan_path in wafer_base_path.glob("imaging/msem/scan_???/*_scan_*"):
         scan_path = Path(wafer_base_path, relative_scan_path)
         if scan_path.is_dir():
             simple_scan_name = scan_path.parent.name
-            if len(exclude_scan_name_list) == 0 or simple_scan_name not in exclude_scan_name_list:
+            if len(exclude_scan_names) == 0 or simple_scan_name not in exclude_scan_names:
                 scan_paths.append(scan_path)
 
     if len(scan_paths) == 0:
@@ -1,41 +1,107 @@
+import json as std_json
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Optional, Union, Any
+from typing import Optional, Union, Any, Iterable
 
 import requests
+from requests.adapters import HTTPAdapter
+# use the urllib3 that requests itself uses (older requests versions bundle their own copy,
+# and their HTTPAdapter does not recognize Retry instances from a separately installed urllib3)
+from requests.packages.urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+def _build_session() -> requests.Session:
+    # reuse pooled keep-alive connections across calls instead of opening a new connection per request
+    # (raise_on_status=False returns the last 502/503/504 response after retries are exhausted
+    #  so that callers still see an HTTPError from raise_for_status instead of a RetryError)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16,
+                          pool_maxsize=64,
+                          max_retries=Retry(total=5,
+                                            backoff_factor=0.3,
+                                            status_forcelist=[502, 503, 504],
+                                            raise_on_status=False))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_SESSION = _build_session()
+
+
+def _encode_json(json_obj: Union[dict[str, Any], list[dict[str, Any]], str]) -> bytes:
+    return std_json.dumps(json_obj).encode("utf-8")
 
 
 def submit_get(url: str,
                context: Optional[str] = None) -> Union[dict[str, Any], list[dict[str, Any]], list[str]]:
-    extra_context = "" if context is None else f" {context}"
-    print(f"submitting GET {url}{extra_context}")
-    response = requests.get(url)
+    logger.debug("submitting GET %s%s", url, "" if context is None else f" {context}")
+    response = _SESSION.get(url)
     response.raise_for_status()
     return response.json()
 
 
+def submit_gets(urls: list[str],
+                max_workers: int = 16) -> list[Union[dict[str, Any], list[dict[str, Any]], list[str]]]:
+    # overlap round trips for groups of independent GET requests using the pooled session connections,
+    # results are returned in url order
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(submit_get, urls))
+
+
 def submit_post(url: str,
                 json: Optional[Union[dict[str, Any], list[dict[str, Any]]]],
                 context: Optional[str] = None) -> None:
-    extra_context = "" if context is None else f" {context}"
-    print(f"submitting POST {url}{extra_context}")
-    response = requests.post(url, json=json)
+    logger.debug("submitting POST %s%s", url, "" if context is None else f" {context}")
+    response = _SESSION.post(url, json=json)
     response.raise_for_status()
 
 
 def submit_put(url: str,
                json: Optional[Union[dict[str, Any], list[dict[str, Any]]]],
                context: Optional[str] = None) -> None:
-    extra_context = "" if context is None else f" {context}"
-    print(f"submitting PUT {url}{extra_context}")
-    response = requests.put(url, json=json)
+    logger.debug("submitting PUT %s%s", url, "" if context is None else f" {context}")
+    if json is None:
+        response = _SESSION.put(url)
+    else:
+        response = _SESSION.put(url, data=_encode_json(json), headers={"Content-Type": "application/json"})
     response.raise_for_status()
 
 
+def submit_put_spooled_json_object(url: str,
+                                   object_name: str,
+                                   items: Iterable[tuple[str, Any]],
+                                   context: Optional[str] = None) -> int:
+    """PUT a {object_name: {key: value, ...}} JSON body whose items are serialized one at a time
+    to a temporary file that is then streamed to the server, so that neither the items nor the
+    full serialized body need to be held in memory.  Returns the number of items submitted."""
+    item_count = 0
+    with tempfile.TemporaryFile() as spool_file:
+        spool_file.write(b'{' + _encode_json(object_name) + b':{')
+        for key, value in items:
+            if item_count > 0:
+                spool_file.write(b',')
+            spool_file.write(_encode_json(key) + b':' + _encode_json(value))
+            item_count += 1
+        spool_file.write(b'}}')
+        spool_file.seek(0)
+
+        logger.debug("submitting PUT %s for %d spooled %s items%s",
+                     url, item_count, object_name, "" if context is None else f" {context}")
+        response = _SESSION.put(url, data=spool_file, headers={"Content-Type": "application/json"})
+        response.raise_for_status()
+
+    return item_count
+
+
 def submit_delete(url: str,
                   context: Optional[str] = None) -> None:
-    extra_context = "" if context is None else f" {context}"
-    print(f"submitting DELETE {url}{extra_context}")
-    response = requests.delete(url)
+    logger.debug("submitting DELETE %s%s", url, "" if context is None else f" {context}")
+    response = _SESSION.delete(url)
     response.raise_for_status()
 
 
@@ -162,6 +228,14 @@ class MatchRequest:
         print(f"retrieved {len(match_counts)} {self.collection} pairs for groupId {group_id}")
         return match_counts
 
+    def get_pairs_with_match_counts_for_groups(self,
+                                               group_ids: list[str]) -> list[list[dict[str, Any]]]:
+        urls = [f"{self.collection_url()}/pGroup/{group_id}/matchCounts" for group_id in group_ids]
+        match_counts_per_group = submit_gets(urls)
+        logger.info("retrieved %d %s pairs for %d groupIds",
+                    sum(len(match_counts) for match_counts in match_counts_per_group), self.collection, len(group_ids))
+        return match_counts_per_group
+
     def get_match_pairs_for_group(self,
                                   group_id: str,
                                   exclude_match_details: bool = False) -> list[dict[str, Any]]:
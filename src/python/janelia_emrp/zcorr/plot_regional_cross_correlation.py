@@ -1,28 +1,142 @@
 #!/usr/bin/env python
 import argparse
-import glob
-import re
+import functools
+import itertools
+import math
+import os
 import sys
 import traceback
-from typing import Final, Any, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Final, Any, Optional, Union, Iterator
 
-from bokeh.io import output_file
+import numpy as np
+from bokeh.embed import file_html
 from bokeh.layouts import column as bokeh_column
 from bokeh.layouts import gridplot
 from bokeh.models import ColumnDataSource, TapTool, OpenURL, BasicTicker, PrintfTickFormatter, LinearColorMapper, \
     ColorBar, Div, Panel, Tabs
 from bokeh.plotting import figure, show, Figure
-from bokeh.transform import linear_cmap
+from bokeh.resources import CDN
+from bokeh.util.browser import view
 
 from janelia_emrp.zcorr.plot_cross_correlation import build_neuroglancer_tap_url
 from janelia_emrp.zcorr.plot_util import get_stack_metadata, load_json_file_data
 
-# .../z/%s/box/-12825,-7107,26455,14179,0.22/render-parameters
-LAYER_URL_PATTERN: Final = re.compile(r".*/box/([^,]+),([^,]+),([^,]+),([^,]+),([^,]+)/render-parameters")
-
 # reversed colormap from https://docs.bokeh.org/en/2.3.3/docs/user_guide/categorical.html?highlight=heatmap
 COLORS: Final = ["#550b1d", "#933b41", "#cc7878", "#ddb7b1", "#dfccce", "#e2e2e2", "#c9d9d3", "#a5bab7", "#75968f"]
 
+# browsers struggle to draw more than this many rects per plot, so larger region grids are coarsened
+MAX_REGIONS: Final = 20_000
+
+TAP_URL_Z_PLACEHOLDER: Final = "{PZ}"
+
+TOOLTIPS: Final = [("region center", "@x, @y"),
+                   ("correlation with next", "@cc"),
+                   ("to view in Neuroglancer", "click")]
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_layer_box(layer_url_pattern_string: str) -> tuple[int, int, int, int]:
+    # parses x, y, width, height from .../z/%s/box/-12825,-7107,26455,14179,0.22/render-parameters
+    # with plain string splitting, most layers in a run share the same url pattern so results are cached
+    _, box_separator, box_and_suffix = layer_url_pattern_string.rpartition("/box/")
+    box, suffix_separator, _ = box_and_suffix.partition("/render-parameters")
+    box_parts = box.split(",")
+    if len(box_separator) == 0 or len(suffix_separator) == 0 or len(box_parts) != 5:
+        raise ValueError(f"failed to parse layer_url_pattern_string: {layer_url_pattern_string}")
+
+    return int(box_parts[0]), int(box_parts[1]), int(box_parts[2]), int(box_parts[3])
+
+
+@functools.lru_cache(maxsize=8)
+def _build_tap_url_template(owner: str,
+                            project: str,
+                            stack: str,
+                            res_x: int,
+                            res_y: int,
+                            res_z: int) -> str:
+    # only z differs between the tap urls for a stack's layers, so the url is built once with a z placeholder
+    return build_neuroglancer_tap_url(owner=owner,
+                                      project=project,
+                                      stack=stack,
+                                      res_x=res_x,
+                                      res_y=res_y,
+                                      res_z=res_z,
+                                      cross_section_scale=4,
+                                      x_y_z_position=f"@x,@y,{TAP_URL_Z_PLACEHOLDER}")
+
+
+def build_region_arrays(regional_correlation: Union[list[list[float]], np.ndarray],
+                        layer_x: int,
+                        layer_y: int,
+                        region_width: int,
+                        region_height: int,
+                        ignore_cc_threshold: float = 0.01) -> tuple[np.ndarray, np.ndarray, np.ndarray, float, float]:
+    # Correlations only drive colors and tooltips, so float32 precision is plenty and
+    # (like the int32 centers) halves the size of the binary arrays bokeh ships to the browser.
+    cc = np.asarray(regional_correlation, dtype=np.float32)
+    row_count, column_count = cc.shape
+    column_centers = layer_x + np.arange(column_count) * region_width + int(region_width / 2)
+    row_centers = layer_y + np.arange(row_count) * region_height + int(region_height / 2)
+    center_x_grid, center_y_grid = np.meshgrid(column_centers, row_centers)
+    region_center_x = center_x_grid.ravel().astype(np.int32, copy=False)
+    region_center_y = center_y_grid.ravel().astype(np.int32, copy=False)
+    cc_with_next = cc.ravel()
+
+    # near zero correlations (e.g. for empty regions) are excluded from the color range
+    # (single masked reductions, the initial values bound the range when no correlation is in it)
+    in_range = cc_with_next > ignore_cc_threshold
+    min_cc = float(np.min(cc_with_next, where=in_range, initial=1.0))
+    max_cc = float(np.max(cc_with_next, where=in_range, initial=0.0))
+
+    return region_center_x, region_center_y, cc_with_next, min_cc - 0.005, max_cc + 0.005
+
+
+def get_coarsen_factors(row_count: int,
+                        column_count: int) -> tuple[int, int]:
+    # returns the smallest (row_factor, column_factor) that brings the coarsened grid under MAX_REGIONS,
+    # each factor is capped at its grid dimension so that thin grids are only coarsened along their long axis
+    factor = max(1, math.ceil(math.sqrt(row_count * column_count / MAX_REGIONS)))
+    while True:
+        row_factor = min(factor, row_count)
+        column_factor = min(factor, column_count)
+        if math.ceil(row_count / row_factor) * math.ceil(column_count / column_factor) <= MAX_REGIONS:
+            return row_factor, column_factor
+        factor += 1
+
+
+def coarsen_regional_correlation(cc: np.ndarray,
+                                 row_factor: int,
+                                 column_factor: int) -> np.ndarray:
+    # averages row_factor x column_factor blocks of regions, NaN padding partial blocks at the bottom and right edges
+    row_count, column_count = cc.shape
+    padded_cc = np.full((math.ceil(row_count / row_factor) * row_factor,
+                         math.ceil(column_count / column_factor) * column_factor),
+                        np.nan, dtype=cc.dtype)
+    padded_cc[:row_count, :column_count] = cc
+    blocks = padded_cc.reshape(padded_cc.shape[0] // row_factor, row_factor,
+                               padded_cc.shape[1] // column_factor, column_factor)
+    return np.nanmean(blocks, axis=(1, 3))
+
+
+def build_fill_colors(cc: np.ndarray,
+                      low: float,
+                      high: float) -> np.ndarray:
+    # Buckets correlations into COLORS once here instead of in the browser on every render, replicating
+    # bokeh's LinearColorMapper.cmap: keys below the palette are black (low_color), keys above it and values
+    # equal to high get the last color, and NaN is gray.  Like bokeh, this also applies when low > high
+    # (which happens when no correlation is above the ignore threshold).
+    cc = np.asarray(cc, dtype=np.float64)
+    color_keys = np.floor((cc - low) * (1 / (high - low)) / (1 / len(COLORS)))
+    max_key = len(COLORS) - 1
+    fill_colors = np.asarray(COLORS, dtype=object)[np.clip(np.nan_to_num(color_keys), 0, max_key).astype(np.intp)]
+    fill_colors[color_keys < 0] = "#000000"
+    fill_colors[cc == high] = COLORS[max_key]
+    fill_colors[np.isnan(cc)] = "gray"
+    return fill_colors
+
 
 def build_poor_regional_correlations_for_z(owner: str,
                                            project: str,
@@ -30,23 +144,17 @@ def build_poor_regional_correlations_for_z(owner: str,
                                            res_x: int,
                                            res_y: int,
                                            res_z: int,
-                                           layer_result: dict[str, Any]):
+                                           layer_result: dict[str, Any],
+                                           color_bar_ticker: Optional[BasicTicker] = None,
+                                           color_bar_formatter: Optional[PrintfTickFormatter] = None):
     p_z = int(layer_result["pZ"])
     q_z = int(layer_result["qZ"])
     layer_correlation = layer_result["layerCorrelation"]
-    regional_correlation = layer_result["regionalCorrelation"]
-    row_count = len(regional_correlation)
-    column_count = len(regional_correlation[0])
+    regional_correlation = np.asarray(layer_result["regionalCorrelation"], dtype=np.float32)
+    row_count, column_count = regional_correlation.shape
     layer_url_pattern_string = layer_result["layerUrlPattern"]
 
-    match = LAYER_URL_PATTERN.match(layer_url_pattern_string)
-    if match is None:
-        raise ValueError(f"failed to parse layer_url_pattern_string: {layer_url_pattern_string}")
-
-    layer_x = int(match.group(1))
-    layer_y = int(match.group(2))
-    layer_width = int(match.group(3))
-    layer_height = int(match.group(4))
+    layer_x, layer_y, layer_width, layer_height = _parse_layer_box(layer_url_pattern_string)
 
     plot_size = 500
     if layer_width > layer_height:
@@ -59,65 +167,56 @@ def build_poor_regional_correlations_for_z(owner: str,
     region_width = int(layer_width / column_count)
     region_height = int(layer_height / row_count)
 
-    region_center_x = []
-    region_center_y = []
-    cc_with_next = []
-    min_cc = 1.0
-    max_cc = 0.0
-    ignore_cc_threshold = 0.01
-    for row in range(0, row_count):
-        y = layer_y + (row * region_height)
-        y_center = y + int(region_height / 2)
-        for column in range(0, column_count):
-            x = layer_x + (column * region_width)
-            x_center = x + int(region_width / 2)
-            region_center_x.append(x_center)
-            region_center_y.append(y_center)
-            cc = regional_correlation[row][column]
-            cc_with_next.append(cc)
-            if cc > ignore_cc_threshold:
-                min_cc = min(min_cc, cc)
-                max_cc = max(max_cc, cc)
-            
-    min_cc = min_cc - 0.005
-    max_cc = max_cc + 0.005
-
-    tap_help = "to view in Neuroglancer"
-    x_y_z_position = f"@x,@y,{p_z}"
-    tap_url = build_neuroglancer_tap_url(owner=owner,
-                                         project=project,
-                                         stack=stack,
-                                         res_x=res_x,
-                                         res_y=res_y,
-                                         res_z=res_z,
-                                         cross_section_scale=4,
-                                         x_y_z_position=x_y_z_position)
-
-    tooltips = [("region center", "@x, @y"),
-                ("correlation with next", "@cc"),
-                (tap_help, "click")]
+    row_factor, column_factor = get_coarsen_factors(row_count, column_count)
+    if row_factor > 1 or column_factor > 1:
+        regional_correlation = coarsen_regional_correlation(regional_correlation, row_factor, column_factor)
+        region_width *= column_factor
+        region_height *= row_factor
+        print(f"WARNING: averaged {row_factor}x{column_factor} blocks of the {row_count}x{column_count} "
+              f"region grid for z {p_z} to keep the plot under {MAX_REGIONS} regions")
+
+    region_center_x, region_center_y, cc_with_next, min_cc, max_cc = \
+        build_region_arrays(regional_correlation=regional_correlation,
+                            layer_x=layer_x,
+                            layer_y=layer_y,
+                            region_width=region_width,
+                            region_height=region_height)
+
+    tap_url = _build_tap_url_template(owner=owner,
+                                      project=project,
+                                      stack=stack,
+                                      res_x=res_x,
+                                      res_y=res_y,
+                                      res_z=res_z).replace(TAP_URL_Z_PLACEHOLDER, str(p_z))
 
     p = figure(title=f"z {p_z} to {q_z}, layer correlation is {layer_correlation:4.2f}",
                x_axis_location="above",
                x_axis_label='X', y_axis_label='Y',
                x_range=[layer_x, layer_x + layer_width],
                y_range=[layer_y + layer_height, layer_y],
-               tooltips=tooltips, tools='tap,save,reset',
+               tooltips=TOOLTIPS, tools='tap,save,reset',
                plot_width=plot_width, plot_height=plot_height, margin=[0, 50, 0, 0])
     p.title.align = 'center'
 
-    data_source = ColumnDataSource(data=dict(x=region_center_x, y=region_center_y, cc=cc_with_next))
+    data_source = ColumnDataSource(data=dict(x=region_center_x, y=region_center_y, cc=cc_with_next,
+                                             fill=build_fill_colors(cc_with_next, min_cc, max_cc)))
 
     rect = p.rect(x="x", y="y", width=region_width, height=region_height, source=data_source,
-                  fill_color=linear_cmap("cc", COLORS, low=min_cc, high=max_cc, low_color="#000000"),
+                  fill_color="fill",
                   line_color="black")
     rect.nonselection_glyph = None  # disable block suppression when region is clicked/selected
 
     mapper = LinearColorMapper(palette=COLORS, low=min_cc, high=max_cc)
 
+    # the ticker and formatter are the same for every layer, so callers building many plots can share them
+    if color_bar_ticker is None:
+        color_bar_ticker = BasicTicker(desired_num_ticks=len(COLORS))
+    if color_bar_formatter is None:
+        color_bar_formatter = PrintfTickFormatter(format="%4.2f")
+
     color_bar = ColorBar(color_mapper=mapper,
-                         ticker=BasicTicker(desired_num_ticks=len(COLORS)),
-                         formatter=PrintfTickFormatter(format="%4.2f"))
+                         ticker=color_bar_ticker,
+                         formatter=color_bar_formatter)
 
     p.add_layout(color_bar, 'right')
 
@@ -127,6 +226,46 @@ def build_poor_regional_correlations_for_z(owner: str,
     return p
 
 
+def find_data_files(run_path: str,
+                    data_file_name_prefix: str) -> list[str]:
+    # Walks run_path with a single scandir per directory (like a recursive glob, hidden entries are skipped)
+    # since run directories are on network storage where glob's extra stat calls are costly.
+    data_file_paths = []
+    dir_paths = [run_path]
+    while len(dir_paths) > 0:
+        try:
+            with os.scandir(dir_paths.pop()) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir():
+                        dir_paths.append(entry.path)
+                    elif entry.name.startswith(data_file_name_prefix):
+                        data_file_paths.append(entry.path)
+        except OSError:
+            # match glob behavior of silently skipping unreadable directories
+            pass
+
+    return sorted(data_file_paths)
+
+
+def load_json_files_in_order(json_paths: list[str],
+                             max_workers: int = 8) -> Iterator[Any]:
+    # Reads and decodes files in parallel (overlapping network storage latency) and yields their data in path order.
+    # At most max_workers files are in flight and the next file is only submitted as each result is consumed,
+    # so decoded data does not pile up when the consumer is slower than loading.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        json_path_iterator = iter(json_paths)
+        pending_futures = deque(executor.submit(load_json_file_data, json_path)
+                                for json_path in itertools.islice(json_path_iterator, max_workers))
+        while len(pending_futures) > 0:
+            json_data = pending_futures.popleft().result()
+            next_json_path = next(json_path_iterator, None)
+            if next_json_path is not None:
+                pending_futures.append(executor.submit(load_json_file_data, next_json_path))
+            yield json_data
+
+
 def append_tab_for_prior_layers(min_z: Optional[float],
                                 max_z: Optional[float],
                                 contiguous_z_plot_list: list[Figure],
@@ -139,7 +278,7 @@ def append_tab_for_prior_layers(min_z: Optional[float],
 
 
 def plot_poor_regional_correlations(title, run_path, owner, project, stack,
-                                    output_file_path=None):
+                                    output_file_path=None, open_plot=True):
     stack_metadata = get_stack_metadata(owner, project, stack)
     stack_version = stack_metadata["currentVersion"]
     res_x = stack_version["stackResolutionX"]
@@ -154,33 +293,36 @@ def plot_poor_regional_correlations(title, run_path, owner, project, stack,
     #   { ... },
     # ]
     poor_data_file_name = "poor_cc_regional_data.json"
-    poor_layer_pair_map = {}
-    glob_pathname = f"{run_path}/**/{poor_data_file_name}*"
-    for cc_data_path in sorted(glob.glob(glob_pathname, recursive=True)):
+    pz_to_qz_and_plot = {}
+    color_bar_ticker = BasicTicker(desired_num_ticks=len(COLORS))
+    color_bar_formatter = PrintfTickFormatter(format="%4.2f")
+    # Per file results are chained lazily rather than combined into one list, so the decoded regional correlation
+    # data for a file is released once its plots have been built (apart from the few files still being loaded).
+    cc_data_per_file = load_json_files_in_order(find_data_files(run_path, poor_data_file_name))
+    for layer_result in itertools.chain.from_iterable(cc_data_per_file):
         # If a poor layer pair occurs near a batch boundary, then the same data will be written in
         # two cc_batches.  Map the pairs here to ensure we only plot each poor pair once.
-        for layer_result in load_json_file_data(cc_data_path):
-            pz = float(layer_result["pZ"])
-            if pz not in poor_layer_pair_map:
-                poor_layer_pair_map[pz] = layer_result
-
-    tab_panel_list = []
-    contiguous_z_plot_list = []
-    first_pz = None
-    previous_pz = None
-    previous_qz = None
-    if len(poor_layer_pair_map) > 0:
-        for pz in sorted(poor_layer_pair_map.keys()):
-            layer_result = poor_layer_pair_map[pz]
+        pz = float(layer_result["pZ"])
+        if pz not in pz_to_qz_and_plot:
             layer_plot = build_poor_regional_correlations_for_z(owner=owner,
                                                                 project=project,
                                                                 stack=stack,
                                                                 res_x=res_x,
                                                                 res_y=res_y,
                                                                 res_z=res_z,
-                                                                layer_result=layer_result)
-            pz = float(layer_result["pZ"])
-            qz = float(layer_result["qZ"])
+                                                                layer_result=layer_result,
+                                                                color_bar_ticker=color_bar_ticker,
+                                                                color_bar_formatter=color_bar_formatter)
+            pz_to_qz_and_plot[pz] = (float(layer_result["qZ"]), layer_plot)
+
+    tab_panel_list = []
+    contiguous_z_plot_list = []
+    first_pz = None
+    previous_pz = None
+    previous_qz = None
+    if len(pz_to_qz_and_plot) > 0:
+        for pz in sorted(pz_to_qz_and_plot.keys()):
+            qz, layer_plot = pz_to_qz_and_plot[pz]
 
             if previous_pz is None or (pz - previous_pz) > 1.0:
                 append_tab_for_prior_layers(min_z=first_pz,
@@ -205,17 +347,22 @@ def plot_poor_regional_correlations(title, run_path, owner, project, stack,
         tabs = Tabs(tabs=tab_panel_list)
 
         if output_file_path:
-            output_file(output_file_path)
+            # Render the document once to standalone html that loads bokeh's js from the CDN
+            # and open the written file directly instead of calling show.
             print(f'writing plot to {output_file_path}')
-
-        show(bokeh_column(page_title, tabs))
+            html = file_html(bokeh_column(page_title, tabs), CDN, title)
+            Path(output_file_path).write_text(html, encoding="utf-8")
+            if open_plot:
+                view(output_file_path)
+        else:
+            show(bokeh_column(page_title, tabs))
 
     else:
         print(f"{run_path} does not contain any {poor_data_file_name} files so there is nothing to plot")
 
 
 # noinspection HttpUrlsUsage
-def plot_run(base_dir, owner, project, stack, run):
+def plot_run(base_dir, owner, project, stack, run, open_plot=True):
     owner_run_sub_path = f'{owner}/{project}/{stack}/{run}'
     run_path = f'{base_dir}/{owner_run_sub_path}'
     plot_html_name = 'poor_cc_regional_data.html'
@@ -225,7 +372,8 @@ def plot_run(base_dir, owner, project, stack, run):
     plot_poor_regional_correlations(title=f'{owner} : {project} : {stack}',
                                     run_path=run_path,
                                     owner=owner, project=project, stack=stack,
-                                    output_file_path=output_file_path)
+                                    output_file_path=output_file_path,
+                                    open_plot=open_plot)
     print(f'view plot at {plot_url}')
 
 
@@ -236,6 +384,8 @@ def main(arg_list):
     parser.add_argument("--stack", required=True)
     parser.add_argument("--run", required=True)
     parser.add_argument("--base_dir", default="/nrs/cellmap/render/z_corr")
+    parser.add_argument("--open", dest="open_plot", default=True, action=argparse.BooleanOptionalAction,
+                        help="open the written plot in a browser (use --no-open for batch runs)")
 
     args = parser.parse_args(arg_list)
 
@@ -243,7 +393,8 @@ def main(arg_list):
              owner=args.owner,
              project=args.project,
              stack=args.stack,
-             run=args.run)
+             run=args.run,
+             open_plot=args.open_plot)
 
 
 if __name__ == '__main__':
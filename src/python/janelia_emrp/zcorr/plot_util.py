@@ -9,14 +9,14 @@ import requests
 def load_json_file_data(json_path):
 
     if json_path.endswith('.gz'):
-        with gzip.open(json_path, 'r') as data_file:
+        with gzip.open(json_path, 'rb') as data_file:
             json_bytes = data_file.read()
-            json_str = json_bytes.decode('utf-8')
     else:
-        with open(json_path, 'r') as data_file:
-            json_str = data_file.read()
+        with open(json_path, 'rb') as data_file:
+            json_bytes = data_file.read()
 
-    return json.loads(json_str)
+    # json.loads accepts utf-8 bytes directly, so there is no need to build an intermediate str
+    return json.loads(json_bytes)
 
 
 def get_stack_metadata(owner, project, stack):
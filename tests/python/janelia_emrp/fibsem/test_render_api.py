@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from janelia_emrp.fibsem.render_api import RenderApi
+from janelia_emrp.fibsem.volume_transfer_info import RenderConnect
+from janelia_emrp.render import web_service_request
+
+
+class StubResponse:
+    def raise_for_status(self):
+        pass
+
+
+class StubSession:
+    def __init__(self):
+        self.put_requests = []
+
+    def put(self, url, data=None, headers=None):
+        self.put_requests.append((url, json.loads(data.read()), headers))
+        return StubResponse()
+
+
+@pytest.fixture
+def stub_session(monkeypatch) -> StubSession:
+    session = StubSession()
+    monkeypatch.setattr(web_service_request, "_SESSION", session)
+    return session
+
+
+@pytest.mark.parametrize("tile_spec_count, expected_batch_sizes", [
+    (0, []),
+    (1, [1]),
+    (2048, [2048]),
+    (2049, [2048, 1]),
+    (5000, [2048, 2048, 904]),
+])
+def test_save_tile_specs(stub_session, tile_spec_count, expected_batch_sizes):
+    render_api = RenderApi(render_owner="test_owner",
+                           render_project="test_project",
+                           render_connect=RenderConnect(host="renderer-dev.int.janelia.org",
+                                                        port=8080,
+                                                        web_only=True,
+                                                        validate_client=False,
+                                                        client_scripts="/groups/flyTEM/flyTEM/render/bin",
+                                                        memGB="1G"))
+    tile_specs = ({"tileId": f"tile_{i}", "z": 1.0, "width": 100} for i in range(tile_spec_count))
+
+    render_api.save_tile_specs(stack="test_stack", tile_specs=tile_specs, derive_data=True)
+
+    batch_sizes = []
+    saved_tile_ids = []
+    for url, body, headers in stub_session.put_requests:
+        assert url == f"{render_api.get_stack_url('test_stack')}/resolvedTiles?deriveData=True", "invalid url"
+        assert headers == {"Content-Type": "application/json"}, "invalid headers"
+        assert list(body.keys()) == ["tileIdToSpecMap"], "invalid body keys"
+        tile_id_to_spec_map = body["tileIdToSpecMap"]
+        for tile_id, tile_spec in tile_id_to_spec_map.items():
+            assert tile_spec["tileId"] == tile_id, f"spec for {tile_id} has mismatched tileId"
+            assert tile_spec["width"] == 100, f"spec for {tile_id} has invalid width"
+        batch_sizes.append(len(tile_id_to_spec_map))
+        saved_tile_ids.extend(tile_id_to_spec_map.keys())
+
+    assert batch_sizes == expected_batch_sizes, "invalid batch sizes"
+    assert saved_tile_ids == [f"tile_{i}" for i in range(tile_spec_count)], "saved tile ids do not match"
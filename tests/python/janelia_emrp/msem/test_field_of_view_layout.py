@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from janelia_emrp.msem.field_of_view_layout import FieldOfViewLayout, NINETEEN_MFOV_COLUMN_GROUPS, \
+    NINETY_ONE_SFOV_NAME_TO_ROW_COL
+
+
+@pytest.fixture
+def wafer_53_layout() -> FieldOfViewLayout:
+    return FieldOfViewLayout(NINETEEN_MFOV_COLUMN_GROUPS, NINETY_ONE_SFOV_NAME_TO_ROW_COL)
+
+
+def test_row_and_col_bulk_matches_row_and_col(wafer_53_layout):
+    mfov_names = [f"{mfov_number:06d}" for mfov_number in range(1, 20)]
+    sfov_index_names = [f"{sfov_number:03d}" for sfov_number in range(1, 92)]
+    expected_rows_and_cols = [wafer_53_layout.row_and_col(mfov_name, sfov_index_name)
+                              for mfov_name in mfov_names
+                              for sfov_index_name in sfov_index_names]
+
+    mfov_numbers = np.repeat(np.arange(1, 20, dtype=np.int32), 91)
+    sfov_numbers = np.tile(np.arange(1, 92, dtype=np.int32), 19)
+    rows, cols = wafer_53_layout.row_and_col_bulk(mfov_numbers, sfov_numbers)
+
+    assert len(expected_rows_and_cols) == 19 * 91, "invalid number of expected entries"
+    assert list(zip(rows.tolist(), cols.tolist())) == expected_rows_and_cols, "bulk rows and cols do not match"
+
+
+@pytest.mark.parametrize("mfov_number, sfov_number", [(0, 1), (1, 0), (20, 1), (1, 92), (-1, 1), (1, -1)])
+def test_row_and_col_bulk_raises_key_error_for_unknown_numbers(wafer_53_layout, mfov_number, sfov_number):
+    with pytest.raises(KeyError):
+        wafer_53_layout.row_and_col_bulk(np.array([1, mfov_number]), np.array([1, sfov_number]))
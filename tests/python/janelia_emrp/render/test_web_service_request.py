@@ -0,0 +1,40 @@
+import json
+import socket
+
+import numpy as np
+import pytest
+import requests
+
+from janelia_emrp.render import web_service_request
+from janelia_emrp.render.web_service_request import _encode_json, submit_get
+
+
+def test_encode_json_with_numpy_float():
+    tile_spec = {
+        "tileId": "tile_a",
+        "layout": {"sectionId": "1.0", "workingDistance": np.float64(3.25)},
+        "mipmapLevels": {0: {"imageUrl": "file:/tmp/a.png"}}
+    }
+
+    encoded = _encode_json(tile_spec)
+
+    assert json.loads(encoded) == {
+        "tileId": "tile_a",
+        "layout": {"sectionId": "1.0", "workingDistance": 3.25},
+        "mipmapLevels": {"0": {"imageUrl": "file:/tmp/a.png"}}
+    }, "encoded tile spec does not match"
+
+
+def test_submit_get_with_refused_connection(monkeypatch):
+    # keep the session's retry policy but skip the backoff sleeps between retries
+    session = web_service_request._build_session()
+    for adapter in session.adapters.values():
+        adapter.max_retries = adapter.max_retries.new(backoff_factor=0)
+    monkeypatch.setattr(web_service_request, "_SESSION", session)
+
+    with socket.socket() as unused_socket:
+        unused_socket.bind(("127.0.0.1", 0))
+        refused_port = unused_socket.getsockname()[1]
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        submit_get(f"http://127.0.0.1:{refused_port}/render-ws/v1/owner/test_owner/stackIds")
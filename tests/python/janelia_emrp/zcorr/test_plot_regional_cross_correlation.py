@@ -0,0 +1,97 @@
+import math
+import threading
+
+import numpy as np
+import pytest
+
+from janelia_emrp.zcorr import plot_regional_cross_correlation
+from janelia_emrp.zcorr.plot_regional_cross_correlation import build_fill_colors, coarsen_regional_correlation, COLORS, \
+    get_coarsen_factors, load_json_files_in_order, MAX_REGIONS
+
+
+def test_build_fill_colors():
+    # 9 colors over [0.2, 0.65] gives buckets that are 0.05 wide
+    cc = np.array([0.2, 0.42, 0.649, 0.65, 0.7, 0.1, np.nan], dtype=np.float32)
+
+    fill_colors = build_fill_colors(cc, low=0.2, high=0.65)
+
+    assert fill_colors.tolist() == [
+        COLORS[0],   # equal to low
+        COLORS[4],
+        COLORS[-1],
+        COLORS[-1],  # equal to high
+        COLORS[-1],  # above high
+        "#000000",   # below low
+        "gray"       # NaN
+    ], "invalid fill colors"
+
+
+def test_build_fill_colors_with_low_above_high():
+    # range produced by build_region_arrays when no correlation is above the ignore threshold,
+    # colors are bucketed the same way bokeh's LinearColorMapper handles the inverted range
+    low = 1.0 - 0.005
+    high = 0.0 + 0.005
+    cc = np.array([0.0, 0.5, 0.999, high], dtype=np.float32)
+
+    fill_colors = build_fill_colors(cc, low=low, high=high)
+
+    assert fill_colors.tolist() == [COLORS[-1], COLORS[4], "#000000", COLORS[-1]], "invalid fill colors"
+
+
+def test_load_json_files_in_order_bounds_in_flight_files(monkeypatch):
+    loaded_paths = []
+    lock = threading.Lock()
+
+    def load_json_file_data(json_path):
+        with lock:
+            loaded_paths.append(json_path)
+        return [{"path": json_path}]
+
+    monkeypatch.setattr(plot_regional_cross_correlation, "load_json_file_data", load_json_file_data)
+
+    json_paths = [f"/run/batch_{i:03d}/poor_cc_regional_data.json" for i in range(20)]
+    consumed_data = []
+    for json_data in load_json_files_in_order(json_paths, max_workers=3):
+        consumed_data.append(json_data)
+        with lock:
+            loaded_count = len(loaded_paths)
+        assert loaded_count <= len(consumed_data) + 3, f"{loaded_count} files loaded after {len(consumed_data)} consumed"
+
+    assert consumed_data == [[{"path": json_path}] for json_path in json_paths], "data not returned in path order"
+
+
+def test_coarsen_regional_correlation_with_partial_blocks():
+    # 5 x 7 grid coarsened by 3 leaves partial blocks along the bottom and right edges
+    cc = np.arange(35, dtype=np.float32).reshape(5, 7)
+
+    coarsened_cc = coarsen_regional_correlation(cc, 3, 3)
+
+    expected_cc = np.array([
+        [cc[0:3, 0:3].mean(), cc[0:3, 3:6].mean(), cc[0:3, 6:7].mean()],
+        [cc[3:5, 0:3].mean(), cc[3:5, 3:6].mean(), cc[3:5, 6:7].mean()]
+    ])
+    assert coarsened_cc.shape == (2, 3), "invalid coarsened shape"
+    assert np.allclose(coarsened_cc, expected_cc), "padding should not affect block means"
+
+
+@pytest.mark.parametrize("row_count, column_count", [
+    (100, 100), (1000, 1000), (1, 100_000), (100_000, 1), (3, 100_000), (141, 142)
+])
+def test_get_coarsen_factors(row_count, column_count):
+    row_factor, column_factor = get_coarsen_factors(row_count, column_count)
+
+    assert 1 <= row_factor <= row_count and 1 <= column_factor <= column_count, "invalid factors"
+    assert math.ceil(row_count / row_factor) * math.ceil(column_count / column_factor) <= MAX_REGIONS, \
+        "coarsened grid should be under MAX_REGIONS"
+
+
+def test_coarsen_regional_correlation_for_thin_grid():
+    # a single row of regions is only coarsened along its columns
+    cc = np.arange(100_000, dtype=np.float32).reshape(1, 100_000)
+
+    row_factor, column_factor = get_coarsen_factors(*cc.shape)
+    coarsened_cc = coarsen_regional_correlation(cc, row_factor, column_factor)
+
+    assert (row_factor, column_factor) == (1, 5), "thin grid should only be coarsened along its long axis"
+    assert coarsened_cc.shape == (1, 20_000), "invalid coarsened shape"
+    assert coarsened_cc.size <= MAX_REGIONS, "coarsened grid should be under MAX_REGIONS"